@@ -8,10 +8,48 @@
 # without an express license agreement from NVIDIA CORPORATION or
 # its affiliates is strictly prohibited.
 
+import time
+
+import numpy as np
 import omni.ext
+import omni.kit.app
 import omni.ui as ui
 import omni.usd
-from pxr import Usd, Sdf, Gf
+from pxr import Usd, Sdf, Gf, Tf, Vt
+
+from . import thermal_kernel
+from .thermal_kernel import classify_delta_t
+
+# ΔT 判定「≈ 目標」的容許誤差
+_DELTA_T_TOL = 1e-3
+
+# 顏色 LUT，索引即分類結果：綠 / 黃 / 紅 / 灰
+_COLOR_LUT = (
+    Gf.Vec3f(0.0, 1.0, 0.0),  # 綠：ΔT < 目標
+    Gf.Vec3f(1.0, 1.0, 0.0),  # 黃：ΔT ≈ 目標
+    Gf.Vec3f(1.0, 0.0, 0.0),  # 紅：ΔT > 目標
+    Gf.Vec3f(0.5, 0.5, 0.5),  # 灰：目標 ΔT 無效
+)
+_COLOR_GRAY_IDX = 3
+
+# 參數連續變動時，兩次重算之間的最短間隔（秒）
+_RECOMPUTE_INTERVAL_S = 0.1
+
+# 每次讀取 / 計算 / 寫回的 rack 數，限制暫存陣列大小
+_TILE_SIZE = 8192
+
+# 待重掃的子樹根超過此數量時改為整個 stage 重掃，也不再累積路徑
+_MAX_RESYNCED_PATHS = 1024
+
+# 屬性名稱（只定義一次，各處共用同一個字串物件）
+_ATTR_POWER = "user:rackPowerW"
+_ATTR_MDOT = "user:mdotActual"
+_ATTR_MDOT_REQUIRED = "user:mdotRequired"
+_ATTR_DISPLAY_COLOR = "primvars:displayColor"
+
+# 影響 rack 清單組成的屬性；這些屬性被新增/移除時需重建快取
+_RACK_ATTR_NAMES = (_ATTR_POWER, _ATTR_MDOT)
+
 # Functions and vars are available to other extensions as usual in python:
 # `my_company.my_python_ui_extension.some_public_function(x)`
 def some_public_function(x: int):
@@ -25,7 +63,7 @@ def some_public_function(x: int):
 # gets enabled, and `on_startup(ext_id)` will be called. Later when the
 # extension gets disabled on_shutdown() is called.
 class MyExtension(omni.ext.IExt):
-        """
+    """
     機房「氣冷顯熱守恆」可視化 Extension
 
     模式：
@@ -50,9 +88,9 @@ class MyExtension(omni.ext.IExt):
         """This is called every time the extension is activated."""
         print("[my_company.my_python_ui_extension] Extension startup")
         self._ext_id = ext_id
-        # 顏色覆蓋用的原始顏色 cache
-        self._orig_colors = {}  # {prim_path: color_array or None}
         self._color_override_enabled_model = ui.SimpleBoolModel(True)
+        # 預先建好的 displayColor 值，所有 prim 共用，不必每次配置 VtArray
+        self._color_lut = tuple(Vt.Vec3fArray([c]) for c in _COLOR_LUT)
 
         # cp & ΔT 模型
         self._cp_model = ui.SimpleFloatModel(1005.0)   # 空氣 cp 近似值
@@ -65,20 +103,86 @@ class MyExtension(omni.ext.IExt):
         self._batch_power_model = ui.SimpleFloatModel(1000.0)
         self._batch_mdot_model = ui.SimpleFloatModel(0.1)
 
-        # 建 UI 視窗
+        # 目前的 stage，開啟/關閉時更新，避免每次都向 UsdContext 查詢
+        self._stage = omni.usd.get_context().get_stage()
+        self._stage_event_sub = (
+            omni.usd.get_context()
+            .get_stage_event_stream()
+            .create_subscription_to_pop(
+                self._on_stage_event, name="rack_thermal stage event"
+            )
+        )
+
+        # rack prim 快取：只在 stage 結構變動時重建，避免每次重算都 Traverse
+        # 以平行 list（SoA）保存，索引一致，重算時不需再用字串查屬性
+        self._rack_stage = None
+        self._rack_prims = []   # list[Usd.Prim]
+        self._paths = []        # list[Sdf.Path]
+        self._power_attrs = []  # 對應的 user:rackPowerW
+        self._mdot_attrs = []   # 對應的 user:mdotActual
+        self._color_attrs = []  # 對應的 primvars:displayColor
+        self._mreq_attrs = []   # 對應的 user:mdotRequired（設計模式寫入）
+        # 顏色覆蓋前的原始顏色（None 代表原本沒有 authored 顏色），
+        # 只對 _touched 中的索引有意義
+        self._orig_color_values = []
+        self._touched = set()   # 已被覆蓋顏色的快取索引
+        # 每個 rack 目前套用的顏色索引，-1 代表未覆蓋；顏色沒變就不重寫
+        self._last_color_idx = np.empty(0, dtype=np.int8)
+        self._rack_prims_dirty = True   # 需整個 stage 重掃
+        self._resynced_paths = set()    # 只需重掃的子樹根路徑
+        self._rack_list_version = 0
+        # 上次重算的輸入；輸入沒變就不重算
+        self._last_key = None
+        self._objects_changed_listener = Tf.Notice.RegisterGlobally(
+            Usd.Notice.ObjectsChanged, self._on_objects_changed
+        )
+
+        # 所有參數變動只設旗標，由 Kit update tick 統一處理，每個 frame 最多重算一次
+        self._dirty = False
+        self._last_recompute_time = 0.0
+        self._update_sub = (
+            omni.kit.app.get_app()
+            .get_update_event_stream()
+            .create_subscription_to_pop(self._on_update, name="rack_thermal update")
+        )
+
+        # 建 UI 視窗；內容延到視窗第一次顯示時才建
+        self._ui_built = False
         self._window = ui.Window(
-            "Rack Thermal Visualization", width=400, height=400
+            "Rack Thermal Visualization",
+            width=400,
+            height=400,
+            visibility_changed_fn=self._on_visibility_changed,
         )
+        # 視窗一建立就可見時不會觸發 visibility_changed_fn
+        if self._window.visible:
+            self._on_visibility_changed(True)
 
     def on_shutdown(self):
         """This is called every time the extension is deactivated. It is used
         to clean up the extension state."""
         print("[my_company.my_python_ui_extension] Extension shutdown")
+        self._update_sub = None
+        self._dirty = False
         self._restore_colors()
+        self._stage_event_sub = None
+        self._stage = None
+        if self._objects_changed_listener:
+            self._objects_changed_listener.Revoke()
+            self._objects_changed_listener = None
+        self._clear_rack_cache()
         self._window = None
+        self._ui_built = False
     # -------------------------------
     # UI 建構
     # -------------------------------
+    def _on_visibility_changed(self, visible):
+        if visible and not self._ui_built:
+            # 面板第一次顯示時才編譯分類核心，不拖慢 Kit 啟動，也不讓第一次重算卡住 UI
+            thermal_kernel.warm_up()
+            self._build_ui()
+            self._ui_built = True
+
     def _build_ui(self):
         with self._window.frame:
             with ui.VStack(spacing=8, height=0):
@@ -129,7 +233,7 @@ class MyExtension(omni.ext.IExt):
 
                         ui.Button(
                             "重新計算並更新顏色",
-                            clicked_fn=self._recompute_and_color,
+                            clicked_fn=lambda: self._recompute_and_color(force=True),
                         )
 
                 ui.Spacer(height=10)
@@ -141,22 +245,163 @@ class MyExtension(omni.ext.IExt):
                     word_wrap=True,
                 )
 
-        # 變更參數時自動重算
-        self._cp_model.add_value_changed_fn(lambda m: self._recompute_and_color())
-        self._target_dt_model.add_value_changed_fn(
-            lambda m: self._recompute_and_color()
-        )
-        self._mode_model.add_value_changed_fn(lambda m: self._recompute_and_color())
-        self._color_override_enabled_model.add_value_changed_fn(
-            lambda m: self._recompute_and_color()
-        )
+        # 變更參數時自動重算（節流，拖曳數值時不會每次都重算）
+        self._cp_model.add_value_changed_fn(self._on_param_changed)
+        self._target_dt_model.add_value_changed_fn(self._on_param_changed)
+        self._mode_model.add_value_changed_fn(self._on_param_changed)
+        self._color_override_enabled_model.add_value_changed_fn(self._on_param_changed)
 
     # -------------------------------
     # 工具函式
     # -------------------------------
+    # 回傳 stage 開啟/關閉事件時更新的快取 stage
     def _get_stage(self):
-        ctx = omni.usd.get_context()
-        return ctx.get_stage()
+        return self._stage
+
+    def _on_stage_event(self, event):
+        if event.type == int(omni.usd.StageEventType.OPENED):
+            self._stage = omni.usd.get_context().get_stage()
+        elif event.type == int(omni.usd.StageEventType.CLOSING):
+            # stage 即將關閉，快取的 prim / 屬性 handle 都會失效
+            self._stage = None
+            self._clear_rack_cache()
+
+    def _clear_rack_cache(self):
+        self._rack_stage = None
+        self._rack_prims = []
+        self._paths = []
+        self._power_attrs = []
+        self._mdot_attrs = []
+        self._color_attrs = []
+        self._mreq_attrs = []
+        self._orig_color_values = []
+        self._touched = set()
+        self._last_color_idx = np.empty(0, dtype=np.int8)
+        self._resynced_paths = set()
+        self._rack_prims_dirty = True
+        self._last_key = None
+
+    # 參數變動：只標記需要重算，實際計算交給 _on_update
+    def _on_param_changed(self, _model):
+        self._dirty = True
+
+    # 每個 Kit update tick 檢查一次；距上次重算至少 _RECOMPUTE_INTERVAL_S，
+    # 旗標會保留到下一個 tick，所以最後一次變動一定會被處理
+    def _on_update(self, _event):
+        if not self._dirty:
+            return
+
+        now = time.monotonic()
+        if now - self._last_recompute_time < _RECOMPUTE_INTERVAL_S:
+            return
+
+        self._dirty = False
+        self._last_recompute_time = now
+        self._recompute_and_color()
+
+    # stage 結構變動（新增/刪除 prim 或 rack 屬性）時記下需重掃的子樹；
+    # rack 屬性值變動時讓下次重算不被略過
+    def _on_objects_changed(self, notice, sender):
+        if sender != self._rack_stage or self._rack_prims_dirty:
+            return
+
+        resynced = False
+        for path in notice.GetResyncedPaths():
+            if path.IsAbsoluteRootOrPrimPath():
+                self._resynced_paths.add(path)
+                resynced = True
+            elif path.name in _RACK_ATTR_NAMES:
+                self._resynced_paths.add(path.GetPrimPath())
+                resynced = True
+        if resynced:
+            self._last_key = None
+            # 路徑只在重算時消化，覆蓋關閉時可能一直累積，過多時直接改成整個重掃
+            if len(self._resynced_paths) > _MAX_RESYNCED_PATHS:
+                self._rack_prims_dirty = True
+                self._resynced_paths = set()
+            return
+
+        for path in notice.GetChangedInfoOnlyPaths():
+            if path.name in _RACK_ATTR_NAMES:
+                self._last_key = None
+                return
+
+    # 需要時更新 rack prim 清單與屬性 handle：
+    # 換 stage 時整個重掃，否則只重掃有 resync 的子樹，其餘 rack 的狀態原樣保留
+    def _ensure_rack_prims(self, stage):
+        if stage != self._rack_stage:
+            self._rack_prims_dirty = True
+        if not self._rack_prims_dirty and not self._resynced_paths:
+            return
+
+        roots = set(Sdf.Path.RemoveDescendentPaths(list(self._resynced_paths)))
+        if Sdf.Path.absoluteRootPath in roots:
+            self._rack_prims_dirty = True
+
+        if self._rack_prims_dirty:
+            # 索引全部失效，先把已覆蓋的顏色恢復；重算時會再重新套用
+            self._restore_colors()
+            keep = []
+            ranges = [Usd.PrimRange.Stage(stage)]
+        else:
+            # 以祖先路徑查 set，每個 rack 為 O(深度)，與 resync 的根數量無關
+            keep = []
+            dropped = []
+            for i, path in enumerate(self._paths):
+                if roots.isdisjoint(path.GetPrefixes()):
+                    keep.append(i)
+                else:
+                    dropped.append(i)
+            # 只恢復即將重掃的 rack，重算時會再重新套用
+            self._restore_colors(dropped)
+            ranges = []
+            for root in roots:
+                prim = stage.GetPrimAtPath(root)
+                if prim:
+                    ranges.append(Usd.PrimRange(prim))
+
+        # 保留的 rack 依序搬到新索引 0..len(keep)-1，狀態一併帶過去
+        rack_prims = [self._rack_prims[i] for i in keep]
+        paths = [self._paths[i] for i in keep]
+        power_attrs = [self._power_attrs[i] for i in keep]
+        mdot_attrs = [self._mdot_attrs[i] for i in keep]
+        color_attrs = [self._color_attrs[i] for i in keep]
+        mreq_attrs = [self._mreq_attrs[i] for i in keep]
+        orig_color_values = [self._orig_color_values[i] for i in keep]
+        touched = {j for j, i in enumerate(keep) if i in self._touched}
+        last_color_idx = self._last_color_idx[np.asarray(keep, dtype=np.intp)]
+
+        for prim_range in ranges:
+            for prim in prim_range:
+                # 只要有 rackPowerW 屬性就納入快取（值可能之後才填），
+                # 是否有值由 _read_rack_inputs 每次重算時檢查
+                attr_p = prim.GetAttribute(_ATTR_POWER)
+                if not attr_p:
+                    continue
+                rack_prims.append(prim)
+                paths.append(prim.GetPath())
+                power_attrs.append(attr_p)
+                mdot_attrs.append(prim.GetAttribute(_ATTR_MDOT))
+                color_attrs.append(prim.GetAttribute(_ATTR_DISPLAY_COLOR))
+                mreq_attrs.append(prim.GetAttribute(_ATTR_MDOT_REQUIRED))
+
+        added = len(rack_prims) - len(keep)
+        self._rack_prims = rack_prims
+        self._paths = paths
+        self._power_attrs = power_attrs
+        self._mdot_attrs = mdot_attrs
+        self._color_attrs = color_attrs
+        self._mreq_attrs = mreq_attrs
+        self._orig_color_values = orig_color_values + [None] * added
+        self._touched = touched
+        self._last_color_idx = np.concatenate(
+            [last_color_idx, np.full(added, -1, dtype=np.int8)]
+        )
+
+        self._rack_stage = stage
+        self._rack_prims_dirty = False
+        self._resynced_paths = set()
+        self._rack_list_version += 1
 
     # 批次將 UI 中的預設 P / mdot 寫入「目前選取」的 prim
     def _apply_defaults_to_selection(self):
@@ -171,32 +416,34 @@ class MyExtension(omni.ext.IExt):
         power_val = self._batch_power_model.get_value_as_float()
         mdot_val = self._batch_mdot_model.get_value_as_float()
 
-        for path in paths:
-            prim = stage.GetPrimAtPath(path)
-            if not prim or not prim.IsValid():
-                continue
+        # 合併所有寫入，只發出一次 USD 變更通知
+        with Sdf.ChangeBlock():
+            for path in paths:
+                prim = stage.GetPrimAtPath(path)
+                if not prim or not prim.IsValid():
+                    continue
 
-            # rackPowerW
-            if power_val is not None:
-                attr_p = prim.GetAttribute("user:rackPowerW")
-                if not attr_p:
-                    attr_p = prim.CreateAttribute(
-                        "user:rackPowerW",
-                        Sdf.ValueTypeNames.Double,
-                        custom=True,
-                    )
-                attr_p.Set(float(power_val))
-
-            # mdotActual
-            if mdot_val is not None:
-                attr_m = prim.GetAttribute("user:mdotActual")
-                if not attr_m:
-                    attr_m = prim.CreateAttribute(
-                        "user:mdotActual",
-                        Sdf.ValueTypeNames.Double,
-                        custom=True,
-                    )
-                attr_m.Set(float(mdot_val))
+                # rackPowerW
+                if power_val is not None:
+                    attr_p = prim.GetAttribute(_ATTR_POWER)
+                    if not attr_p:
+                        attr_p = prim.CreateAttribute(
+                            _ATTR_POWER,
+                            Sdf.ValueTypeNames.Double,
+                            custom=True,
+                        )
+                    attr_p.Set(float(power_val))
+
+                # mdotActual
+                if mdot_val is not None:
+                    attr_m = prim.GetAttribute(_ATTR_MDOT)
+                    if not attr_m:
+                        attr_m = prim.CreateAttribute(
+                            _ATTR_MDOT,
+                            Sdf.ValueTypeNames.Double,
+                            custom=True,
+                        )
+                    attr_m.Set(float(mdot_val))
 
         print(
             f"[rack_thermal] Applied defaults to {len(paths)} prim(s): "
@@ -206,8 +453,9 @@ class MyExtension(omni.ext.IExt):
         # 屬性變了，重算一次
         self._recompute_and_color()
 
-    # 主計算邏輯：走過 stage 上所有有 user:rackPowerW 的 prim
-    def _recompute_and_color(self):
+    # 主計算邏輯：處理快取中所有有 user:rackPowerW 的 prim
+    # 輸入與上次相同時直接略過，force=True 時一定重算並重寫所有顏色
+    def _recompute_and_color(self, force=False):
         stage = self._get_stage()
         if stage is None:
             return
@@ -217,19 +465,86 @@ class MyExtension(omni.ext.IExt):
         mode = self._mode_model.get_value_as_int()
         enable_override = self._color_override_enabled_model.get_value_as_bool()
 
+        if enable_override:
+            self._ensure_rack_prims(stage)
+
+        key = (cp, target_dt, mode, enable_override, id(stage), self._rack_list_version)
+        if not force and key == self._last_key:
+            return
+        self._last_key = key
+        if force:
+            self._last_color_idx.fill(-1)
+
         # 若關閉顏色覆蓋，就恢復原色後直接 return
         if not enable_override:
             self._restore_colors()
             return
 
-        # 開啟覆蓋時先清掉舊的顏色紀錄，重新 cache
-        self._orig_colors = {}
+        # 設計模式且目標 ΔT 無效時，沒有任何 prim 需要處理
+        if mode == 0 and target_dt <= 0.0:
+            return
 
-        for prim in stage.Traverse():
-            if not prim.IsValid():
-                continue
+        # 分 tile 處理，每個 tile 的暫存陣列留在 cache 內，用完即丟
+        n = len(self._rack_prims)
+        for tile_start in range(0, n, _TILE_SIZE):
+            self._process_tile(
+                tile_start, min(tile_start + _TILE_SIZE, n), cp, target_dt, mode
+            )
+
+    # 處理快取索引 [start, stop) 的 rack：讀取 → 計算 → 寫回
+    def _process_tile(self, start, stop, cp, target_dt, mode):
+        # 第一輪：讀取 P / mdot
+        size = stop - start
+        P = np.zeros(size, dtype=np.float64)
+        M = np.zeros(size, dtype=np.float64)
+        valid = np.zeros(size, dtype=bool)
+        self._read_rack_inputs(start, stop, mode, P, M, valid)
+
+        # 有效 rack 在 tile 內的位置與快取索引
+        local = np.flatnonzero(valid)
+        if local.size == 0:
+            return
+        rows = start + local
+
+        # 設計模式：P + 目標 ΔT → 所需 mdot，顏色用目標 ΔT
+        # 稽核模式：P + mdotActual → ΔT（在分類核心中計算）
+        m_required = P[local] / (cp * target_dt) if mode == 0 else None
 
-            attr_p = prim.GetAttribute("user:rackPowerW")
+        # 依 ΔT 相對於目標值分類：0 綠、1 黃、2 紅、3 灰（目標 ΔT 無效）
+        # 整個 tile 直接送進核心（無效 rack 的 P、mdot 皆為 0，不會除以 0），
+        # 省去先挑出有效 rack 的複製
+        if target_dt <= 0.0:
+            color_idx = np.full(len(rows), _COLOR_GRAY_IDX, dtype=np.int8)
+        else:
+            color_idx = classify_delta_t(P, M, cp, target_dt, mode, _DELTA_T_TOL)[local]
+
+        # 第二輪：寫回 mdotRequired 與顏色，每個 tile 合併成一次 USD 變更通知
+        with Sdf.ChangeBlock():
+            if m_required is not None:
+                for i, m_req in zip(rows, m_required.tolist()):
+                    attr_m_req = self._mreq_attrs[i]
+                    if not attr_m_req:
+                        attr_m_req = self._rack_prims[i].CreateAttribute(
+                            _ATTR_MDOT_REQUIRED,
+                            Sdf.ValueTypeNames.Double,
+                            custom=True,
+                        )
+                        self._mreq_attrs[i] = attr_m_req
+                    attr_m_req.Set(m_req)
+
+            # 只寫入顏色有變的 rack，依顏色分組，同一組共用同一個 VtArray
+            changed = color_idx != self._last_color_idx[rows]
+            rows = rows[changed]
+            color_idx = color_idx[changed]
+            for c, color in enumerate(self._color_lut):
+                for i in rows[color_idx == c].tolist():
+                    self._apply_color_for_prim(i, color)
+            self._last_color_idx[rows] = color_idx
+
+    # 讀取快取索引 [start, stop) 的 P / mdot，寫入 P[0:stop-start] 等陣列
+    def _read_rack_inputs(self, start, stop, mode, P, M, valid):
+        for k, i in enumerate(range(start, stop)):
+            attr_p = self._power_attrs[i]
             if not attr_p or not attr_p.HasAuthoredValue():
                 continue
 
@@ -241,28 +556,10 @@ class MyExtension(omni.ext.IExt):
             if power_w <= 0.0:
                 continue
 
-            if mode == 0:
-                # 設計模式：P + 目標 ΔT → 所需 mdot
-                if target_dt <= 0.0:
-                    continue
-                m_required = power_w / (cp * target_dt)
-
-                # 寫入 user:mdotRequired
-                attr_m_req = prim.GetAttribute("user:mdotRequired")
-                if not attr_m_req:
-                    attr_m_req = prim.CreateAttribute(
-                        "user:mdotRequired",
-                        Sdf.ValueTypeNames.Double,
-                        custom=True,
-                    )
-                attr_m_req.Set(float(m_required))
-
-                # 顏色用目標 ΔT
-                delta_t = target_dt
-
-            else:
-                # 稽核模式：P + mdotActual → ΔT
-                attr_m = prim.GetAttribute("user:mdotActual")
+            mdot = 0.0
+            if mode != 0:
+                # 稽核模式需要 mdotActual
+                attr_m = self._mdot_attrs[i]
                 if not attr_m or not attr_m.HasAuthoredValue():
                     continue
 
@@ -274,70 +571,87 @@ class MyExtension(omni.ext.IExt):
                 if mdot <= 0.0:
                     continue
 
-                delta_t = power_w / (cp * mdot)
+            P[k] = power_w
+            M[k] = mdot
+            valid[k] = True
 
-            # 依 ΔT 相對於目標值上色
-            self._apply_color_for_prim(prim, delta_t, target_dt)
+    # i 為 rack 快取中的索引
+    def _apply_color_for_prim(self, i: int, color: Vt.Vec3fArray):
+        color_attr = self._color_attrs[i]
 
-    def _apply_color_for_prim(self, prim: Usd.Prim, delta_t: float, target_dt: float):
-        path = str(prim.GetPath())
-        stage = self._get_stage()
-        if stage is None:
-            return
-
-        # Cache 原本的 displayColor（只存一次）
-        if path not in self._orig_colors:
-            color_attr = prim.GetAttribute("primvars:displayColor")
+        # Cache 原本的 displayColor（只存一次，直到恢復原色為止）
+        if i not in self._touched:
             if color_attr and color_attr.HasAuthoredValue():
-                self._orig_colors[path] = color_attr.Get()
+                self._orig_color_values[i] = color_attr.Get()
             else:
-                self._orig_colors[path] = None
+                self._orig_color_values[i] = None
+            self._touched.add(i)
 
         # 設定新顏色
-        tol = 1e-3
-        if target_dt <= 0.0:
-            color = Gf.Vec3f(0.5, 0.5, 0.5)
-        else:
-            if delta_t < (target_dt - tol):
-                color = Gf.Vec3f(0.0, 1.0, 0.0)   # 綠
-            elif abs(delta_t - target_dt) <= tol:
-                color = Gf.Vec3f(1.0, 1.0, 0.0)   # 黃
-            else:
-                color = Gf.Vec3f(1.0, 0.0, 0.0)   # 紅
-
-        color_attr = prim.GetAttribute("primvars:displayColor")
         if not color_attr:
-            color_attr = prim.CreateAttribute(
-                "primvars:displayColor",
+            color_attr = self._rack_prims[i].CreateAttribute(
+                _ATTR_DISPLAY_COLOR,
                 Sdf.ValueTypeNames.Color3fArray,
                 custom=False,
             )
+            self._color_attrs[i] = color_attr
 
-        color_attr.Set([color])
+        color_attr.Set(color)
 
-    def _restore_colors(self):
-        """將所有被覆蓋的 rack 顏色恢復成啟用前的值。"""
-        stage = self._get_stage()
-        if stage is None:
+    def _restore_colors(self, indices=None):
+        """將被覆蓋的 rack 顏色恢復成啟用前的值。
+
+        indices 為 None 時恢復全部，否則只恢復其中有被覆蓋的快取索引。
+        """
+        if indices is None:
+            targets = list(self._touched)
+        else:
+            targets = [i for i in indices if i in self._touched]
+        if not targets:
             return
 
-        for path, orig in self._orig_colors.items():
-            prim = stage.GetPrimAtPath(path)
-            if not prim or not prim.IsValid():
-                continue
+        stage = self._rack_stage
+        with Sdf.ChangeBlock():
+            for i in targets:
+                orig = self._orig_color_values[i]
+                self._orig_color_values[i] = None
+
+                prim = self._rack_prims[i]
+                if not prim.IsValid():
+                    # prim 暫時失效（祖先停用、payload 卸載、切換 variant）時，
+                    # 覆蓋的顏色仍留在 layer 中，改由 spec 恢復，否則會被當成原色
+                    if stage is not None:
+                        self._restore_color_spec(stage, self._paths[i], orig)
+                    continue
 
-            color_attr = prim.GetAttribute("primvars:displayColor")
+                color_attr = self._color_attrs[i]
+
+                if orig is None:
+                    if color_attr:
+                        prim.RemoveProperty(_ATTR_DISPLAY_COLOR)
+                else:
+                    if not color_attr:
+                        color_attr = prim.CreateAttribute(
+                            _ATTR_DISPLAY_COLOR,
+                            Sdf.ValueTypeNames.Color3fArray,
+                            custom=False,
+                        )
+                        self._color_attrs[i] = color_attr
+                    color_attr.Set(orig)
 
-            if orig is None:
-                if color_attr:
-                    prim.RemoveProperty("primvars:displayColor")
-            else:
-                if not color_attr:
-                    color_attr = prim.CreateAttribute(
-                        "primvars:displayColor",
-                        Sdf.ValueTypeNames.Color3fArray,
-                        custom=False,
-                    )
-                color_attr.Set(orig)
+        self._touched.difference_update(targets)
+        self._last_color_idx[targets] = -1
 
-        self._orig_colors = {}
+    # prim 失效時無法透過 Usd API 寫入，直接改 edit target layer 上的屬性 spec
+    def _restore_color_spec(self, stage, path, orig):
+        edit_target = stage.GetEditTarget()
+        attr_spec = edit_target.GetLayer().GetAttributeAtPath(
+            edit_target.MapToSpecPath(path).AppendProperty(_ATTR_DISPLAY_COLOR)
+        )
+        if not attr_spec:
+            return
+
+        if orig is None:
+            attr_spec.owner.RemoveProperty(attr_spec)
+        else:
+            attr_spec.default = orig
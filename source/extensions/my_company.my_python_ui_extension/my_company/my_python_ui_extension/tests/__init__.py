@@ -9,3 +9,5 @@
 # its affiliates is strictly prohibited.
 
 from .test_hello_world import *
+from .test_rack_thermal import *
+from .test_thermal_kernel import *
@@ -0,0 +1,193 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: LicenseRef-NvidiaProprietary
+#
+# NVIDIA CORPORATION, its affiliates and licensors retain all intellectual
+# property and proprietary rights in and to this material, related
+# documentation and any modifications thereto. Any use, reproduction,
+# disclosure or distribution of this material and related documentation
+# without an express license agreement from NVIDIA CORPORATION or
+# its affiliates is strictly prohibited.
+
+import omni.kit.test
+from pxr import Gf, Sdf, Usd, Vt
+
+from my_company.my_python_ui_extension import MyExtension
+
+_GREEN = Gf.Vec3f(0.0, 1.0, 0.0)
+_YELLOW = Gf.Vec3f(1.0, 1.0, 0.0)
+_RED = Gf.Vec3f(1.0, 0.0, 0.0)
+_BLUE = Gf.Vec3f(0.0, 0.0, 1.0)
+
+
+# 以記憶體內 stage 驗證重算 / 快取 / 恢復原色的狀態邏輯
+class TestRackThermal(omni.kit.test.AsyncTestCase):
+    async def setUp(self):
+        self._stage = Usd.Stage.CreateInMemory()
+        self._ext = MyExtension()
+        self._ext.on_startup("my_company.my_python_ui_extension-test")
+        self._ext._stage = self._stage
+        # 稽核模式，cp = 1000、mdot = 1 時 ΔT = P / 1000
+        self._ext._mode_model.set_value(1)
+        self._ext._cp_model.set_value(1000.0)
+        self._ext._target_dt_model.set_value(10.0)
+        self._ext._color_override_enabled_model.set_value(True)
+
+        # 記錄被寫入顏色的 prim（USD 對相同值的 Set 不發通知，所以直接包住寫入函式）
+        self._color_writes = set()
+        apply_color = self._ext._apply_color_for_prim
+
+        def _record_color_write(i, color):
+            self._color_writes.add(self._ext._paths[i].pathString)
+            apply_color(i, color)
+
+        self._ext._apply_color_for_prim = _record_color_write
+
+    async def tearDown(self):
+        self._ext.on_shutdown()
+        self._ext = None
+        self._stage = None
+
+    def _add_rack(self, name, power_w, mdot=1.0, color=None):
+        prim = self._stage.DefinePrim(f"/World/{name}", "Cube")
+        prim.CreateAttribute(
+            "user:rackPowerW", Sdf.ValueTypeNames.Double, custom=True
+        ).Set(power_w)
+        prim.CreateAttribute(
+            "user:mdotActual", Sdf.ValueTypeNames.Double, custom=True
+        ).Set(mdot)
+        if color is not None:
+            prim.CreateAttribute(
+                "primvars:displayColor", Sdf.ValueTypeNames.Color3fArray
+            ).Set(Vt.Vec3fArray([color]))
+        return prim
+
+    def _color(self, prim):
+        attr = prim.GetAttribute("primvars:displayColor")
+        if not attr or not attr.HasAuthoredValue():
+            return None
+        return list(attr.Get())
+
+    def _recompute(self):
+        self._color_writes.clear()
+        self._ext._recompute_and_color()
+
+    async def test_only_flipped_racks_are_rewritten(self):
+        a = self._add_rack("A", 5000.0)
+        b = self._add_rack("B", 10000.0)
+        c = self._add_rack("C", 20000.0)
+
+        self._recompute()
+        self.assertEqual(self._color(a), [_GREEN])
+        self.assertEqual(self._color(b), [_YELLOW])
+        self.assertEqual(self._color(c), [_RED])
+        self.assertEqual(self._color_writes, {"/World/A", "/World/B", "/World/C"})
+
+        # cp 減半 → ΔT 加倍：A 綠→黃、B 黃→紅、C 仍為紅
+        self._ext._cp_model.set_value(500.0)
+        self._recompute()
+        self.assertEqual(self._color(a), [_YELLOW])
+        self.assertEqual(self._color(b), [_RED])
+        self.assertEqual(self._color(c), [_RED])
+        self.assertEqual(self._color_writes, {"/World/A", "/World/B"})
+
+        # 輸入沒變時不重算
+        self._recompute()
+        self.assertEqual(self._color_writes, set())
+
+    async def test_override_off_restores_original_colors(self):
+        a = self._add_rack("A", 5000.0, color=_BLUE)
+        b = self._add_rack("B", 20000.0)
+
+        self._recompute()
+        # 再以不同參數重算一次，原色不可被覆蓋後的顏色取代
+        self._ext._cp_model.set_value(2000.0)
+        self._recompute()
+        self.assertEqual(self._color(a), [_GREEN])
+        self.assertEqual(self._color(b), [_YELLOW])
+
+        self._ext._color_override_enabled_model.set_value(False)
+        self._recompute()
+        self.assertEqual(self._color(a), [_BLUE])
+        self.assertIsNone(self._color(b))
+
+        # 已恢復後再強制重算，原色不應被改動
+        self._ext._recompute_and_color(force=True)
+        self.assertEqual(self._color(a), [_BLUE])
+        self.assertIsNone(self._color(b))
+
+    async def test_adding_rack_keeps_other_racks_state(self):
+        a = self._add_rack("A", 5000.0, color=_BLUE)
+        b = self._add_rack("B", 20000.0)
+        self._recompute()
+
+        c = self._add_rack("C", 10000.0)
+        self._recompute()
+        self.assertEqual(self._color(c), [_YELLOW])
+        # 既有 rack 不需要恢復再重畫
+        self.assertEqual(self._color_writes, {"/World/C"})
+
+        self._ext._color_override_enabled_model.set_value(False)
+        self._recompute()
+        self.assertEqual(self._color(a), [_BLUE])
+        self.assertIsNone(self._color(b))
+        self.assertIsNone(self._color(c))
+
+    async def test_deactivated_rack_keeps_original_color(self):
+        a = self._add_rack("Row/A", 5000.0, color=_BLUE)
+        self._recompute()
+        self.assertEqual(self._color(a), [_GREEN])
+
+        # 祖先停用時 rack 會從快取移除，覆蓋的顏色須先恢復
+        row = self._stage.GetPrimAtPath("/World/Row")
+        row.SetActive(False)
+        self._recompute()
+        row.SetActive(True)
+        a = self._stage.GetPrimAtPath("/World/Row/A")
+        self._recompute()
+        self.assertEqual(self._color(a), [_GREEN])
+
+        self._ext._color_override_enabled_model.set_value(False)
+        self._recompute()
+        self.assertEqual(self._color(a), [_BLUE])
+
+    async def test_resynced_paths_are_bounded(self):
+        a = self._add_rack("A", 5000.0)
+        self._recompute()
+
+        # 覆蓋關閉時不會重算，大量新增 prim 也不能讓待重掃路徑無限累積
+        self._ext._color_override_enabled_model.set_value(False)
+        self._recompute()
+        for k in range(2000):
+            self._stage.DefinePrim(f"/World/Filler/P{k}")
+        self.assertLessEqual(len(self._ext._resynced_paths), 1024)
+
+        b = self._add_rack("B", 20000.0)
+        self._ext._color_override_enabled_model.set_value(True)
+        self._recompute()
+        self.assertEqual(self._color(a), [_GREEN])
+        self.assertEqual(self._color(b), [_RED])
+
+    async def test_value_change_invalidates_memo(self):
+        a = self._add_rack("A", 5000.0)
+        self._recompute()
+        self.assertEqual(self._color(a), [_GREEN])
+
+        # 只改屬性值（info-only 變更），參數未變也要重算
+        a.GetAttribute("user:rackPowerW").Set(20000.0)
+        self._recompute()
+        self.assertEqual(self._color(a), [_RED])
+
+    async def test_rack_without_power_value_is_picked_up_later(self):
+        prim = self._stage.DefinePrim("/World/Empty", "Cube")
+        power = prim.CreateAttribute(
+            "user:rackPowerW", Sdf.ValueTypeNames.Double, custom=True
+        )
+        prim.CreateAttribute(
+            "user:mdotActual", Sdf.ValueTypeNames.Double, custom=True
+        ).Set(1.0)
+        self._recompute()
+        self.assertIsNone(self._color(prim))
+
+        power.Set(20000.0)
+        self._recompute()
+        self.assertEqual(self._color(prim), [_RED])
@@ -0,0 +1,55 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: LicenseRef-NvidiaProprietary
+#
+# NVIDIA CORPORATION, its affiliates and licensors retain all intellectual
+# property and proprietary rights in and to this material, related
+# documentation and any modifications thereto. Any use, reproduction,
+# disclosure or distribution of this material and related documentation
+# without an express license agreement from NVIDIA CORPORATION or
+# its affiliates is strictly prohibited.
+
+import numpy as np
+import omni.kit.test
+
+from my_company.my_python_ui_extension import thermal_kernel
+from my_company.my_python_ui_extension.thermal_kernel import classify_delta_t
+
+
+class TestThermalKernel(omni.kit.test.AsyncTestCase):
+    async def test_audit_mode_buckets(self):
+        # cp = 1000, mdot = 1 → ΔT = P / 1000
+        P = np.array([5000.0, 10000.0, 10000.5, 20000.0])
+        M = np.ones(4)
+        idx = classify_delta_t(P, M, 1000.0, 10.0, 1, 1e-3)
+        self.assertEqual(idx.dtype, np.int8)
+        self.assertEqual(idx.tolist(), [0, 1, 1, 2])
+
+    async def test_nan_is_red(self):
+        # 異常資料不可被當成低於目標（綠色）
+        P = np.array([np.nan, 5000.0])
+        M = np.array([1.0, np.nan])
+        idx = classify_delta_t(P, M, 1000.0, 10.0, 1, 1e-3)
+        self.assertEqual(idx.tolist(), [2, 2])
+        expected = thermal_kernel._classify_numpy(P, M, 1000.0, 10.0, 1, 1e-3)
+        self.assertEqual(expected.tolist(), [2, 2])
+
+    async def test_design_mode_is_on_target(self):
+        P = np.array([100.0, 5000.0])
+        idx = classify_delta_t(P, np.zeros(2), 1005.0, 10.0, 0, 1e-3)
+        self.assertEqual(idx.tolist(), [1, 1])
+
+    async def test_numba_and_numpy_agree_at_boundaries(self):
+        # ΔT 落在 目標 ± tol 內外一點點的位置，兩個實作必須分到同一色
+        cp = 1005.0
+        target = 10.0
+        tol = 1e-3
+        offsets = np.array([-2e-5, -1e-6, 0.0, 1e-6, 2e-5])
+        dt = np.concatenate([target - tol + offsets, target + tol + offsets])
+        M = np.linspace(0.05, 2.0, dt.size)
+        P = dt * cp * M
+
+        expected = thermal_kernel._classify_numpy(P, M, cp, target, 1, tol)
+        actual = thermal_kernel._load_classify()(P, M, cp, target, 1, tol)
+        self.assertEqual(actual.tolist(), expected.tolist())
+        # 邊界兩側都要有涵蓋到
+        self.assertEqual(set(expected.tolist()), {0, 1, 2})
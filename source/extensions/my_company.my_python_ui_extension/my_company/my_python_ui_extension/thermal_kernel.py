@@ -0,0 +1,101 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: LicenseRef-NvidiaProprietary
+#
+# NVIDIA CORPORATION, its affiliates and licensors retain all intellectual
+# property and proprietary rights in and to this material, related
+# documentation and any modifications thereto. Any use, reproduction,
+# disclosure or distribution of this material and related documentation
+# without an express license agreement from NVIDIA CORPORATION or
+# its affiliates is strictly prohibited.
+
+"""ΔT 分類核心：P / mdot 陣列 → 顏色索引（0 綠、1 黃、2 紅）。
+
+有安裝 numba 時使用 @njit 平行版本，否則退回 NumPy 向量化版本，兩者結果相同。
+numba 在第一次使用時才 import（import 本身就要數百毫秒），不拖慢 Kit 啟動。
+numba 版本刻意不開 fastmath：fastmath 會把除法改寫成倒數相乘，
+落在 目標 ± tol 邊界附近的 rack 會被分到不同顏色。
+numba 版本不寫入磁碟快取（cache=False），第一次呼叫時才 JIT 編譯，
+可用 warm_up() 在面板第一次顯示時先編譯好。
+輸入與運算皆為 float64：呼叫端從 USD 讀到的值本來就是 double，
+直接沿用可省去轉型時的額外複製。
+"""
+
+import numpy as np
+
+# 避免 mdot 為 0 時除以 0
+_MDOT_EPS = 1e-30
+
+# 與 classify_delta_t 傳入的型別一致（float64 連續陣列、int64 mode）
+_NUMBA_SIGNATURE = "(float64[::1], float64[::1], float64, float64, int64, float64)"
+
+# 實際使用的分類核心，第一次使用時由 _load_classify() 決定
+_classify = None
+
+
+def _classify_numpy(P, M, cp, target_dt, mode, tol):
+    if mode == 0:
+        dt = np.full(P.shape[0], target_dt, dtype=np.float64)
+    else:
+        dt = P / (cp * np.maximum(M, _MDOT_EPS))
+    # 以遮罩相加取得索引，不做逐元素分支；比較式取反，NaN 會落在紅色
+    not_below = ~(dt < target_dt - tol)
+    above = ~(dt <= target_dt + tol)
+    return not_below.astype(np.int8) + above
+
+
+def _load_classify():
+    global _classify
+    if _classify is not None:
+        return _classify
+
+    try:
+        import numba
+    except ImportError:
+        _classify = _classify_numpy
+        return _classify
+
+    @numba.njit(parallel=True)
+    def _classify_numba(P, M, cp, target_dt, mode, tol):
+        n = P.shape[0]
+        out = np.empty(n, dtype=np.int8)
+        lo = target_dt - tol
+        hi = target_dt + tol
+        for k in numba.prange(n):
+            if mode == 0:
+                dt = target_dt
+            else:
+                dt = P[k] / (cp * max(M[k], _MDOT_EPS))
+            out[k] = (not dt < lo) + (not dt <= hi)
+        return out
+
+    _classify = _classify_numba
+    return _classify
+
+
+def classify_delta_t(P, M, cp, target_dt, mode, tol):
+    """依 ΔT 相對於目標值分類每個 rack。
+
+    設計模式（mode == 0）的 ΔT 即為目標 ΔT；稽核模式為 P / (cp * mdot)。
+    回傳 int8 陣列：ΔT < 目標 - tol 為 0，|ΔT - 目標| <= tol 為 1，
+    其餘（含 NaN，資料異常）為 2。
+    """
+    return _load_classify()(
+        np.ascontiguousarray(P, dtype=np.float64),
+        np.ascontiguousarray(M, dtype=np.float64),
+        float(cp),
+        float(target_dt),
+        int(mode),
+        float(tol),
+    )
+
+
+def warm_up():
+    """import numba 並預先編譯 classify_delta_t 會用到的簽章。
+
+    需在主執行緒呼叫：平行核心若在背景執行緒編譯或啟動，
+    workqueue 執行緒層會與主執行緒的呼叫互相衝突而中止程序，
+    TBB 執行緒層則會在程序結束時卡住。
+    """
+    classify = _load_classify()
+    if classify is not _classify_numpy:
+        classify.compile(_NUMBA_SIGNATURE)